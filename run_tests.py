@@ -8,93 +8,255 @@ including both Rust and Python tests.
 
 import sys
 import os
+import io
+import re
+import shlex
+import functools
+import importlib.util
 import subprocess
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 
-def run_command(command, cwd=None, capture_output=False):
-    """Run a command and return the result."""
+class _StageOutput:
+    """Stdout proxy that routes writes to the calling thread's stage buffer."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def _target(self):
+        return getattr(self._local, "buffer", self._stream)
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def run_stage(self, func, *args):
+        """Run a stage, returning its result and everything it printed."""
+        self._local.buffer = io.StringIO()
+        try:
+            return func(*args), self._local.buffer.getvalue()
+        finally:
+            del self._local.buffer
+
+    def run_live(self, func, *args):
+        """Run a stage that writes straight to the real stream as it goes."""
+        return func(*args), ""
+
+
+# Echoed after each command in a batch so the combined output shows how far
+# the ``&&`` chain got before it stopped.
+_BATCH_MARKER = "__drainage_batch_step_done__"
+
+# An example script is considered runnable if it defines main() or has a
+# __main__ guard; matched on raw bytes so files are never decoded.
+_EXAMPLE_ENTRY_POINT = re.compile(rb"def main\(|if __name__")
+
+@functools.lru_cache(maxsize=None)
+def _have(module):
+    """Return whether a module can be imported, without importing it."""
+    return importlib.util.find_spec(module) is not None
+
+
+def _format_command(command):
+    """Render an argv list as a single command line for the current shell."""
+    if os.name == "nt":
+        return subprocess.list2cmdline(command)
+    return shlex.join(command)
+
+
+def _decode(output):
+    """Decode captured subprocess bytes for display."""
+    return output.decode("utf-8", errors="replace")
+
+
+def run_command(command, cwd=None, *, tee=False):
+    """Run an argv list and return the result, or None if it failed.
+
+    By default stdout is discarded and only stderr is kept for the failure
+    message. With ``tee`` the combined output is streamed line by line while
+    the command runs instead of being buffered. Output stays as bytes and is
+    only decoded when it is printed.
+    """
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            cwd=cwd,
-            capture_output=capture_output,
-            text=True,
-            check=True
-        )
-        return result
-    except subprocess.CalledProcessError as e:
-        print(f"Command failed: {command}")
-        print(f"Error: {e}")
-        if e.stdout:
-            print(f"Stdout: {e.stdout}")
-        if e.stderr:
-            print(f"Stderr: {e.stderr}")
+        if tee:
+            with subprocess.Popen(
+                command,
+                cwd=cwd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+            ) as process:
+                for line in iter(process.stdout.readline, b""):
+                    print(_decode(line), end="", flush=True)
+            result = subprocess.CompletedProcess(command, process.returncode)
+        else:
+            result = subprocess.run(
+                command,
+                cwd=cwd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+    except OSError as e:
+        # Without a shell a missing executable raises instead of exiting 127
+        print(f"Command failed: {_format_command(command)}")
+        print(f"Error: command not found ({e})")
+        return None
+    
+    if result.returncode != 0:
+        print(f"Command failed: {_format_command(command)}")
+        print(f"Error: exit status {result.returncode}")
+        if result.stderr:
+            print(f"Stderr: {_decode(result.stderr)}")
         return None
+    return result
+
+
+def run_batched(commands, cwd=None):
+    """Run argv lists in a single shell joined with ``&&``.
+
+    Returns one entry per command: True if it passed, False if it failed and
+    None if it never ran because an earlier command failed.
+    """
+    script = " && ".join(
+        f"{_format_command(command)} && echo {_BATCH_MARKER}" for command in commands
+    )
+    result = subprocess.run(script, shell=True, cwd=cwd, capture_output=True)
+    
+    marker = _BATCH_MARKER.encode()
+    lines = result.stdout.splitlines(keepends=True)
+    completed = sum(line.strip() == marker for line in lines)
+    if result.returncode != 0:
+        print(f"Command failed: {_format_command(commands[completed])}")
+        print(f"Error: exit status {result.returncode}")
+        stdout = b"".join(line for line in lines if line.strip() != marker)
+        if stdout:
+            print(f"Stdout: {_decode(stdout)}")
+        if result.stderr:
+            print(f"Stderr: {_decode(result.stderr)}")
+    
+    return [
+        True if index < completed else False if index == completed else None
+        for index in range(len(commands))
+    ]
 
 
-def run_rust_tests():
-    """Run Rust unit tests."""
+def run_checks(checks):
+    """Run ``(label, command)`` checks as one batch and report each result."""
+    results = run_batched([command for _, command in checks])
+    for (label, _), passed in zip(checks, results):
+        if passed is None:
+            print(f"⚠️  {label} skipped after an earlier failure")
+        elif passed:
+            print(f"✅ {label} passed")
+        else:
+            print(f"❌ {label} failed")
+    return all(results)
+
+
+# Importable module name -> pip package for everything the pytest stages need;
+# -n comes from pytest-xdist, so it is checked alongside pytest itself.
+_PYTEST_PACKAGES = {"pytest": "pytest", "pytest_mock": "pytest-mock", "xdist": "pytest-xdist"}
+
+
+def ensure_pytest_installed(bootstrap=False):
+    """Check pytest and its plugins, installing missing ones when ``bootstrap`` is set."""
+    missing = [package for module, package in _PYTEST_PACKAGES.items() if not _have(module)]
+    if not missing:
+        return True
+    
+    names = ", ".join(missing)
+    if not bootstrap:
+        print(f"❌ {names} not available. Install with: pip install -r requirements.txt")
+        print("   or rerun with --bootstrap to install automatically")
+        return False
+    print(f"❌ {names} not available. Installing...")
+    result = run_command([sys.executable, "-m", "pip", "install", *missing])
+    if result is None:
+        print(f"❌ Failed to install {names}")
+        return False
+    return True
+
+
+def ensure_drainage_built():
+    """Build the drainage extension with maturin if it is not importable."""
+    if _have("drainage"):
+        print("✅ drainage module is available")
+        return True
+    
+    print("❌ drainage module not available. Building...")
+    result = run_command(["maturin", "develop"])
+    if result is None:
+        print("❌ Failed to build drainage module")
+        return False
+    return True
+
+
+def run_pytest(args):
+    """Run pytest and return whether the session passed.
+
+    pytest runs in its own interpreter: in-process, its output capture swaps
+    the process-wide ``sys.stdout`` and would swallow whatever the concurrent
+    stages print while the session is running.
+    """
+    return run_command([sys.executable, "-m", "pytest", *args], tee=True) is not None
+
+
+def run_rust_tests(verbose=False):
+    """Run Rust unit tests, streaming cargo's output when ``verbose`` is set."""
     print("Running Rust unit tests...")
     print("=" * 50)
     
-    result = run_command("cargo test", capture_output=True)
+    result = run_command(["cargo", "test"], tee=verbose)
     if result is None:
         print("❌ Rust tests failed")
+        if not verbose:
+            print("   rerun with --verbose to see the full test output")
         return False
     
     print("✅ Rust tests passed")
-    print(f"Output: {result.stdout}")
     return True
 
 
-def run_python_tests():
-    """Run Python tests."""
+def run_python_tests(jobs="auto", bootstrap=False):
+    """Run Python tests across ``jobs`` pytest-xdist workers.
+
+    This session covers every test under ``tests/``, integration-marked ones
+    included, so ``main`` does not schedule a separate integration session
+    alongside it.
+    """
     print("Running Python tests...")
     print("=" * 50)
     
-    # Check if pytest is available
-    try:
-        import pytest
-    except ImportError:
-        print("❌ pytest not available. Installing...")
-        result = run_command("pip install pytest pytest-mock", capture_output=True)
-        if result is None:
-            print("❌ Failed to install pytest")
-            return False
+    if not ensure_pytest_installed(bootstrap):
+        return False
     
     # Run pytest
-    result = run_command("python -m pytest tests/ -v", capture_output=True)
-    if result is None:
+    if not run_pytest(["tests/", "-v", "-n", str(jobs)]):
         print("❌ Python tests failed")
         return False
     
     print("✅ Python tests passed")
-    print(f"Output: {result.stdout}")
     return True
 
 
-def run_integration_tests():
-    """Run integration tests."""
+def run_integration_tests(jobs="auto", bootstrap=False):
+    """Run integration tests across ``jobs`` pytest-xdist workers."""
     print("Running integration tests...")
     print("=" * 50)
     
-    # Check if drainage module is available
-    try:
-        import drainage
-        print("✅ drainage module is available")
-    except ImportError:
-        print("❌ drainage module not available. Building...")
-        result = run_command("maturin develop", capture_output=True)
-        if result is None:
-            print("❌ Failed to build drainage module")
-            return False
+    if not ensure_pytest_installed(bootstrap):
+        return False
     
     # Run integration tests
-    result = run_command("python -m pytest tests/ -m integration -v", capture_output=True)
-    if result is None:
+    if not run_pytest(["tests/", "-m", "integration", "-v", "-n", str(jobs)]):
         print("❌ Integration tests failed")
         return False
     
@@ -102,6 +264,20 @@ def run_integration_tests():
     return True
 
 
+@functools.lru_cache(maxsize=None)
+def _example_scripts(examples_dir, mtime_ns):
+    """List example scripts, cached until the directory's mtime changes."""
+    return tuple(examples_dir.glob("*.py"))
+
+
+def _read_script(script):
+    """Read a script's bytes, returning the exception instead of raising it."""
+    try:
+        return script.read_bytes()
+    except Exception as e:
+        return e
+
+
 def run_example_tests():
     """Run example tests."""
     print("Running example tests...")
@@ -113,24 +289,26 @@ def run_example_tests():
         return False
     
     # Test each example script
-    example_scripts = list(examples_dir.glob("*.py"))
+    example_scripts = _example_scripts(examples_dir, examples_dir.stat().st_mtime_ns)
     if not example_scripts:
         print("❌ No example scripts found")
         return False
     
-    for script in example_scripts:
+    # Reads are independent I/O, so overlap them; the pattern check below is
+    # cheap and stays sequential so the report keeps its order
+    with ThreadPoolExecutor(max_workers=min(8, len(example_scripts))) as executor:
+        contents = list(executor.map(_read_script, example_scripts))
+    
+    for script, content in zip(example_scripts, contents):
         print(f"Testing {script.name}...")
-        # Test that the script can be imported and has a main function
-        try:
-            with open(script, 'r') as f:
-                content = f.read()
-                if 'def main(' in content or 'if __name__' in content:
-                    print(f"✅ {script.name} has proper structure")
-                else:
-                    print(f"⚠️  {script.name} may not have proper structure")
-        except Exception as e:
-            print(f"❌ Error reading {script.name}: {e}")
+        # Test that the script has a main function or a __main__ guard
+        if isinstance(content, Exception):
+            print(f"❌ Error reading {script.name}: {content}")
             return False
+        if _EXAMPLE_ENTRY_POINT.search(content):
+            print(f"✅ {script.name} has proper structure")
+        else:
+            print(f"⚠️  {script.name} may not have proper structure")
     
     print("✅ Example tests passed")
     return True
@@ -141,27 +319,17 @@ def run_linting():
     print("Running linting checks...")
     print("=" * 50)
     
-    # Check Rust linting
-    print("Checking Rust code...")
-    result = run_command("cargo clippy -- -D warnings", capture_output=True)
-    if result is None:
-        print("❌ Rust linting failed")
-        return False
-    print("✅ Rust code passed linting")
+    checks = [("Rust linting", ["cargo", "clippy", "--", "-D", "warnings"])]
     
     # Check Python linting (if flake8 is available)
-    try:
-        import flake8
-        print("Checking Python code...")
-        result = run_command("flake8 tests/ examples/ --max-line-length=100", capture_output=True)
-        if result is None:
-            print("❌ Python linting failed")
-            return False
-        print("✅ Python code passed linting")
-    except ImportError:
+    if _have("flake8"):
+        checks.append(
+            ("Python linting", ["flake8", "tests/", "examples/", "--max-line-length=100"])
+        )
+    else:
         print("⚠️  flake8 not available, skipping Python linting")
     
-    return True
+    return run_checks(checks)
 
 
 def run_formatting():
@@ -169,27 +337,15 @@ def run_formatting():
     print("Running formatting checks...")
     print("=" * 50)
     
-    # Check Rust formatting
-    print("Checking Rust formatting...")
-    result = run_command("cargo fmt -- --check", capture_output=True)
-    if result is None:
-        print("❌ Rust formatting failed")
-        return False
-    print("✅ Rust code is properly formatted")
+    checks = [("Rust formatting", ["cargo", "fmt", "--", "--check"])]
     
     # Check Python formatting (if black is available)
-    try:
-        import black
-        print("Checking Python formatting...")
-        result = run_command("black --check tests/ examples/", capture_output=True)
-        if result is None:
-            print("❌ Python formatting failed")
-            return False
-        print("✅ Python code is properly formatted")
-    except ImportError:
+    if _have("black"):
+        checks.append(("Python formatting", ["black", "--check", "tests/", "examples/"]))
+    else:
         print("⚠️  black not available, skipping Python formatting check")
     
-    return True
+    return run_checks(checks)
 
 
 def main():
@@ -202,6 +358,22 @@ def main():
     parser.add_argument("--lint", action="store_true", help="Run only linting checks")
     parser.add_argument("--format", action="store_true", help="Run only formatting checks")
     parser.add_argument("--all", action="store_true", help="Run all tests and checks")
+    parser.add_argument(
+        "--jobs",
+        default="auto",
+        help="Number of pytest-xdist workers for Python tests (default: auto)",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Stream the full output of the Rust test run",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        action="store_true",
+        help="Install pytest and its plugins if they are missing",
+    )
     
     args = parser.parse_args()
     
@@ -209,31 +381,62 @@ def main():
     if not any([args.rust, args.python, args.integration, args.examples, args.lint, args.format]):
         args.all = True
     
-    success = True
-    
-    if args.all or args.rust:
-        if not run_rust_tests():
-            success = False
-    
-    if args.all or args.python:
-        if not run_python_tests():
-            success = False
+    # The Python session already runs integration-marked tests, so the
+    # integration-only session is scheduled just when it is requested alone.
+    run_python = args.all or args.python
+    stages = [
+        (args.all or args.rust, run_rust_tests, (args.verbose,)),
+        (run_python, run_python_tests, (args.jobs, args.bootstrap)),
+        (
+            args.integration and not run_python,
+            run_integration_tests,
+            (args.jobs, args.bootstrap),
+        ),
+        (args.all or args.examples, run_example_tests, ()),
+        (args.all or args.lint, run_linting, ()),
+        (args.all or args.format, run_formatting, ()),
+    ]
+    selected = [(func, func_args) for enabled, func, func_args in stages if enabled]
+    # A verbose Rust run streams cargo's output live instead of buffering it
+    live = {run_rust_tests} if args.verbose else set()
     
-    if args.all or args.integration:
-        if not run_integration_tests():
-            success = False
+    # Probe the optional Python modules once up front; the stages reuse the
+    # cached answers.
+    modules = ("pytest", "xdist", "drainage", "flake8", "black")
+    probes = ", ".join(f"{module} {'✅' if _have(module) else '❌'}" for module in modules)
+    print(f"Python modules: {probes}")
     
-    if args.all or args.examples:
-        if not run_example_tests():
-            success = False
+    # Build the extension once before the stages start, so maturin does not
+    # contend with cargo test and clippy for the cargo target-dir lock.
+    success = True
+    if run_python or args.integration:
+        success = ensure_drainage_built()
     
-    if args.all or args.lint:
-        if not run_linting():
-            success = False
+    # Stages are independent subprocesses, so run them concurrently and
+    # replay each buffered stage's output in declaration order afterwards.
+    outputs = [""] * len(selected)
+    original_stdout = sys.stdout
+    stage_output = _StageOutput(original_stdout)
+    sys.stdout = stage_output
+    try:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = {
+                executor.submit(
+                    stage_output.run_live if func in live else stage_output.run_stage,
+                    func,
+                    *func_args,
+                ): index
+                for index, (func, func_args) in enumerate(selected)
+            }
+            for future in as_completed(futures):
+                passed, outputs[futures[future]] = future.result()
+                success &= passed
+    finally:
+        sys.stdout = original_stdout
     
-    if args.all or args.format:
-        if not run_formatting():
-            success = False
+    for output in outputs:
+        if output:
+            print(output)
     
     if success:
         print("\n🎉 All tests passed!")